@@ -5,6 +5,8 @@ import sys
 import os
 import os.path
 import getopt
+import mmap
+import array
 import sqlite3
 import struct
 import traceback
@@ -14,6 +16,10 @@ try:
     import pycalcal.pycalcal as pcc
 except:
     import pycalcal as pcc
+try:
+    from multiprocessing import shared_memory, resource_tracker
+except:
+    shared_memory = None
 from collections import namedtuple
 
 try:
@@ -26,6 +32,116 @@ CDate = namedtuple('CDate', 'cycle, offset, month, leap, day')
 def CDate_from_fixed(date):
     return CDate(*pcc.chinese_from_fixed(date))
 
+MonthEvents = namedtuple('MonthEvents', 'date, new_moon, next_new_moon, '
+        'next_next_new_moon, minor_solterm, major_solterm, '
+        'c_date, c_new_moon_date, c_last_date')
+EventTable = namedtuple('EventTable', 'first_year, last_year, data, handle')
+
+# Event table layout: a flat native int32 array, header followed by one row
+# per Gregorian month holding the fixed dates of MonthEvents and the three
+# CDates flattened as (cycle, offset, month, leap, day).
+_events_magic = 0x43434556
+_events_hdrlen = 4 # magic, row length, first year, last year
+_events_rowlen = 21
+
+def build_events(first_year, last_year):
+    ar = array.array('i', (_events_magic, _events_rowlen,
+        first_year, last_year))
+    new_moons = {}
+    def new_moon_on_or_after(date):
+        if date not in new_moons:
+            new_moons[date] = int(pcc.chinese_new_moon_on_or_after(date))
+        return new_moons[date]
+    for year in range(first_year, last_year + 1):
+        for month in range(1, 13):
+            date = pcc.fixed_from_gregorian((year, month, 1))
+            last_date = pcc.fixed_from_gregorian((year + int(month == 12),
+                month % 12 + 1, 1)) - 1
+            new_moon_date = new_moon_on_or_after(date)
+            next_new_moon_date = new_moon_on_or_after(new_moon_date + 29)
+            ar.extend((date, new_moon_date, next_new_moon_date,
+                new_moon_on_or_after(next_new_moon_date + 29)))
+            ar.extend(map(pcc.fixed_from_moment, (
+                pcc.minor_solar_term_on_or_after(date),
+                pcc.major_solar_term_on_or_after(date))))
+            for d in (date, new_moon_date, last_date):
+                ar.extend(map(int, pcc.chinese_from_fixed(d)))
+    return ar
+
+def _events_from_buffer(buf, handle):
+    try:
+        data = buf[:len(buf) // 4 * 4].cast('i')
+        if len(data) < _events_hdrlen or data[0] != _events_magic \
+                or data[1] != _events_rowlen:
+            data.release()
+            raise ValueError('Not a calendar event table.')
+        first_year, last_year = data[2], data[3]
+        size = _events_hdrlen + (last_year - first_year + 1) * 12 * \
+                _events_rowlen
+        if len(data) < size:
+            data.release()
+            raise ValueError('Truncated calendar event table.')
+    except:
+        buf.release()
+        handle.close()
+        raise
+    return EventTable(first_year, last_year, data, handle)
+
+def _check_shared_memory():
+    if not shared_memory:
+        raise RuntimeError('Shared memory needs Python 3.8+, '
+                'use save_events() and load_events() instead.')
+
+def publish_events(first_year, last_year, name=None):
+    _check_shared_memory()
+    ar = build_events(first_year, last_year)
+    size = len(ar) * ar.itemsize
+    shm = shared_memory.SharedMemory(name, create=True, size=size)
+    shm.buf[:size] = memoryview(ar).cast('B')
+    return _events_from_buffer(shm.buf[:size], shm)
+
+def attach_events(name):
+    _check_shared_memory()
+    try:
+        shm = shared_memory.SharedMemory(name, track=False)
+    except TypeError: # Python < 3.13
+        shm = shared_memory.SharedMemory(name)
+        # otherwise this process' tracker unlinks the table when it exits
+        if os.name == 'posix':
+            resource_tracker.unregister(shm._name, 'shared_memory')
+    return _events_from_buffer(shm.buf.toreadonly(), shm)
+
+def save_events(fname, first_year, last_year):
+    with open(fname, 'wb') as f:
+        build_events(first_year, last_year).tofile(f)
+
+def load_events(fname):
+    with open(fname, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return _events_from_buffer(memoryview(mm), mm)
+
+def close_events(events, unlink=False):
+    events.data.release()
+    events.handle.close()
+    if unlink: # publisher of a shared memory table is done with it
+        events.handle.unlink()
+
+def month_events(events, year, month):
+    if not events or not events.first_year <= year <= events.last_year:
+        return
+    i = _events_hdrlen + ((year - events.first_year) * 12 + month - 1
+            ) * _events_rowlen
+    r = events.data[i:i + _events_rowlen].tolist()
+    return MonthEvents(*r[:6] + [CDate(c[0], c[1], c[2], bool(c[3]), c[4])
+        for c in (r[6:11], r[11:16], r[16:21])])
+
+def major_solterm_of(year, month, events=None):
+    ev = month_events(events, year, month)
+    if ev:
+        return ev.major_solterm
+    return pcc.fixed_from_moment(pcc.major_solar_term_on_or_after(
+        pcc.fixed_from_gregorian((year, month, 1))))
+
 _en_solterms = [
         "[XH]", "[DH]", "[LC]", "[YS]", "[JZ]", "[CF]", "[QM]", "[GY]",
         "[LX]", "[XM]", "[MZ]", "[XZ]", "[XS]", "[DS]", "[LQ]", "[CS]",
@@ -103,8 +219,41 @@ def day_name(day, lang='en', miscchar=_en_miscchar):
             a, b = divmod(day, 10)
             return miscchar[9 + a] + miscchar[b]
 
-def print_month(year, month, days, lang='en', enc='ascii',
-        last_c_date=None, ext={}, f=sys.stdout):
+def str_width(s):
+    return len(s) + len(u''.join(filter(lambda c: ord(c) > 0xFF, s)))
+
+def fit_cell(s, width=10):
+    x = str_width(s) - len(s)
+    if len(s) + x <= width:
+        return s.center(width - x)
+    x = width - 2 - str_width(s[-1]) # room left for the head of s
+    cr = []
+    for c in s[:-1]:
+        x -= str_width(c)
+        if x < 0:
+            cr.append('.' * (x + str_width(c)))
+            break
+        cr.append(c)
+    cr.append('..')
+    cr.append(s[-1])
+    s = ''.join(cr)
+    assert str_width(s) == width
+    return s
+
+def lunar_cell(s, width=10):
+    # follows the 2-column Gregorian day number
+    if str_width(s) + 1 <= width - 2:
+        s = ' ' + s
+    return s + ' ' * (width - 2 - str_width(s))
+
+Layout = namedtuple('Layout', 'width, blank, weekdays, dates, days, months, '
+        'monnames, sexagenary, solterms, miscterms')
+_layouts = {}
+
+def get_layout(lang='en', width=10):
+    if (lang, width) in _layouts:
+        return _layouts[lang, width]
+    assert width >= 10
     if lang == 'en':
         solterms = _en_solterms
         daynames = _en_daynames
@@ -112,6 +261,57 @@ def print_month(year, month, days, lang='en', enc='ascii',
         branches = _en_branches
         miscchar = _en_miscchar
         miscterm = _en_miscterm
+    else:
+        solterms = _chs_solterms
+        daynames = _chs_daynames
+        stems    = _chs_stems
+        branches = _chs_branches
+        miscchar = _chs_miscchar
+        miscterm = _chs_miscterm
+    monnames = {}
+    months = {}
+    for month in range(1, 13):
+        for leap in (False, True):
+            s = month_name(CDate(0, 0, month, leap, 0), lang, miscchar)
+            monnames[month, leap] = s
+            if type(s) == int:
+                s = '[%2d]Y%s' % (s, leap and miscchar[13] or ' ')
+            else:
+                if leap:
+                    s = miscchar[13] + s
+                s += miscchar[14]
+            months[month, leap] = lunar_cell(s, width)
+    layout = Layout(
+            width = width,
+            blank = ' ' * width,
+            weekdays = ''.join([s + ' ' * (width - str_width(s))
+                for s in daynames]),
+            dates = [None] + ['%2d' % (i,) for i in range(1, 32)],
+            days = [None] + [lunar_cell(day_name(i, lang, miscchar), width)
+                for i in range(1, 31)],
+            months = months,
+            monnames = monnames,
+            sexagenary = [fit_cell(stems[i % 10] + branches[i % 12], width)
+                for i in range(60)],
+            solterms = [lunar_cell(s, width) for s in solterms],
+            miscterms = [fit_cell(_miscterm_fmt % (s,), width)
+                for s in miscterm],
+            )
+    _layouts[lang, width] = layout
+    return layout
+
+def anniv_cell(cells, s, width=10):
+    if (s, width) not in cells:
+        cells[s, width] = fit_cell(s, width)
+    return cells[s, width]
+
+def print_month(year, month, days, lang='en', enc='ascii',
+        last_c_date=None, ext={}, f=sys.stdout, width=10):
+    layout = get_layout(lang, width)
+    if lang == 'en':
+        stems    = _en_stems
+        branches = _en_branches
+        miscchar = _en_miscchar
         monhdfmt0 = '%(monname)s %(year)d (Year %(stem)s%(branch)s, ' + \
                 'Month %(leap)s%(month)d%(length)s)'
         monhdfmt1 = '%(monname)s %(year)d (Year %(stem)s%(branch)s, ' + \
@@ -123,16 +323,12 @@ def print_month(year, month, days, lang='en', enc='ascii',
                 'Month %(leap)s%(month)d%(length)s S%(day)d, ' + \
                 'Year %(astem)s%(abranch)s, Month ' + \
                 '%(aleap)s%(amonth)d%(alength)s S%(aday)d)'
-        dayowfmt = '%-10s'
         anniv_birth_fmt = _en_anniv_birth_fmt
         anniv_death_fmt = _en_anniv_death_fmt
     else:
-        solterms = _chs_solterms
-        daynames = _chs_daynames
         stems    = _chs_stems
         branches = _chs_branches
         miscchar = _chs_miscchar
-        miscterm = _chs_miscterm
         monhdfmt0 = u'%(monname)s %(year)d  %(stem)s%(branch)s年' + \
                 u'%(leap)s%(month)s月%(length)s'
         monhdfmt1 = u'%(monname)s %(year)d  %(stem)s%(branch)s年' + \
@@ -144,69 +340,87 @@ def print_month(year, month, days, lang='en', enc='ascii',
                 u'%(leap)s%(month)s月%(length)s%(day)d日始，' + \
                 u'%(astem)s%(abranch)s年' + \
                 u'%(aleap)s%(amonth)s月%(alength)s%(aday)d日始'
-        dayowfmt = '%s   '
         anniv_birth_fmt = _chs_anniv_birth_fmt
         anniv_death_fmt = _chs_anniv_death_fmt
-    date = pcc.fixed_from_gregorian((year, month, 1))
-    new_moon_date = pcc.chinese_new_moon_on_or_after(date)
-    next_new_moon_date = pcc.chinese_new_moon_on_or_after(new_moon_date + 29)
-    last_date = date + days - 1
-    #c_date = CDate_from_fixed(date)
-    #c_new_moon_date = CDate_from_fixed(new_moon_date)
-    #c_last_date = CDate_from_fixed(last_date)
-    minor_solterm_date = pcc.minor_solar_term_on_or_after(date)
-    major_solterm_date = pcc.major_solar_term_on_or_after(date)
-    minor_solterm_date, major_solterm_date = map(pcc.fixed_from_moment,
-            (minor_solterm_date, major_solterm_date))
-    if not last_c_date:
-        c_date = CDate_from_fixed(date)
+    ev = month_events(ext.get('events'), year, month)
+    if ev:
+        date = ev.date
+        new_moon_date = ev.new_moon
+        next_new_moon_date = ev.next_new_moon
+        last_date = date + days - 1
+        minor_solterm_date = ev.minor_solterm
+        major_solterm_date = ev.major_solterm
+        c_date = ev.c_date
+        c_new_moon_date = ev.c_new_moon_date
+        c_last_date = ev.c_last_date
     else:
-        if last_c_date.day < 29 or (last_c_date.day == 29
-                and date != new_moon_date):
-            c_date = CDate(last_c_date.offset, last_c_date.offset,
-                    last_c_date.month, last_c_date.leap, last_c_date.day + 1)
+        date = pcc.fixed_from_gregorian((year, month, 1))
+        new_moon_date = pcc.chinese_new_moon_on_or_after(date)
+        next_new_moon_date = pcc.chinese_new_moon_on_or_after(
+                new_moon_date + 29)
+        last_date = date + days - 1
+        #c_date = CDate_from_fixed(date)
+        #c_new_moon_date = CDate_from_fixed(new_moon_date)
+        #c_last_date = CDate_from_fixed(last_date)
+        minor_solterm_date = pcc.minor_solar_term_on_or_after(date)
+        major_solterm_date = pcc.major_solar_term_on_or_after(date)
+        minor_solterm_date, major_solterm_date = map(pcc.fixed_from_moment,
+                (minor_solterm_date, major_solterm_date))
+        if not last_c_date:
+            c_date = CDate_from_fixed(date)
         else:
-            assert date == new_moon_date
-            if last_c_date.month == 12:
-                if last_c_date.offset == 60:
-                    c_date = CDate(last_c_date.cycle + 1, 1, 1, False, 1)
+            if last_c_date.day < 29 or (last_c_date.day == 29
+                    and date != new_moon_date):
+                c_date = CDate(last_c_date.offset, last_c_date.offset,
+                        last_c_date.month, last_c_date.leap,
+                        last_c_date.day + 1)
+            else:
+                assert date == new_moon_date
+                if last_c_date.month == 12:
+                    if last_c_date.offset == 60:
+                        c_date = CDate(last_c_date.cycle + 1, 1, 1, False, 1)
+                    else:
+                        c_date = CDate(last_c_date.cycle,
+                                last_c_date.offset + 1, 1, False, 1)
+                else:
+                    c_date = CDate(last_c_date.cycle, last_c_date.offset,
+                            last_c_date.month + 1, False, 1)
+        if new_moon_date == date:
+            c_new_moon_date = c_date
+        elif (new_moon_date <= major_solterm_date
+                or new_moon_date + 5 > last_date):
+            # next major solterm 19~24-29~30
+            if c_date.month == 12:
+                if c_date.offset == 60:
+                    c_new_moon_date = CDate(c_date.cycle + 1, 1, 1, False, 1)
                 else:
-                    c_date = CDate(last_c_date.cycle, last_c_date.offset + 1,
+                    c_new_moon_date = CDate(c_date.cycle, c_date.offset + 1,
                             1, False, 1)
             else:
-                c_date = CDate(last_c_date.cycle, last_c_date.offset,
-                        last_c_date.month + 1, False, 1)
-    if new_moon_date == date:
-        c_new_moon_date = c_date
-    elif (new_moon_date <= major_solterm_date
-            or new_moon_date + 5 > last_date): # next major solterm 19~24-29~30
-        if c_date.month == 12:
-            if c_date.offset == 60:
-                c_new_moon_date = CDate(c_date.cycle + 1, 1, 1, False, 1)
-            else:
-                c_new_moon_date = CDate(c_date.cycle, c_date.offset + 1,
-                        1, False, 1)
+                c_new_moon_date = CDate(c_date.cycle, c_date.offset,
+                        c_date.month + 1, False, 1)
         else:
-            c_new_moon_date = CDate(c_date.cycle, c_date.offset,
-                    c_date.month + 1, False, 1)
-    else:
-        c_new_moon_date = CDate_from_fixed(new_moon_date)
-    if last_date >= new_moon_date:
-        if last_date < next_new_moon_date:
-            c_last_date = CDate(c_new_moon_date.cycle, c_new_moon_date.offset,
-                    c_new_moon_date.month, c_new_moon_date.leap,
-                    c_new_moon_date.day + last_date - new_moon_date)
+            c_new_moon_date = CDate_from_fixed(new_moon_date)
+        if last_date >= new_moon_date:
+            if last_date < next_new_moon_date:
+                c_last_date = CDate(c_new_moon_date.cycle,
+                        c_new_moon_date.offset, c_new_moon_date.month,
+                        c_new_moon_date.leap,
+                        c_new_moon_date.day + last_date - new_moon_date)
+            else:
+                c_last_date = CDate_from_fixed(last_date)
         else:
-            c_last_date = CDate_from_fixed(last_date)
-    else:
-        c_last_date = CDate(c_date.cycle, c_date.offset,
-                c_date.month, c_date.leap, c_date.day + last_date - date)
+            c_last_date = CDate(c_date.cycle, c_date.offset,
+                    c_date.month, c_date.leap, c_date.day + last_date - date)
     if new_moon_date <= last_date:
         if (c_new_moon_date.month, c_new_moon_date.leap) != (
                 c_last_date.month, c_last_date.leap):
             assert last_date - c_last_date.day + 1 == next_new_moon_date
-            next_next_nmd = pcc.chinese_new_moon_on_or_after(
-                    next_new_moon_date + 29)
+            if ev:
+                next_next_nmd = ev.next_next_new_moon
+            else:
+                next_next_nmd = pcc.chinese_new_moon_on_or_after(
+                        next_new_moon_date + 29)
             if month == 1:
                 assert c_new_moon_date.offset != c_last_date.offset
                 monhdfmt = monhdfmt3
@@ -218,14 +432,16 @@ def print_month(year, month, days, lang='en', enc='ascii',
                     year = year,
                     stem = stems[(c_new_moon_date.offset - 1) % 10],
                     branch = branches[(c_new_moon_date.offset - 1) % 12],
-                    month = month_name(c_new_moon_date, lang, miscchar),
+                    month = layout.monnames[c_new_moon_date.month,
+                        c_new_moon_date.leap],
                     leap = c_new_moon_date.leap and miscchar[13] or '',
                     length = miscchar[15 + int(
                         next_new_moon_date - new_moon_date == 29)],
                     day = new_moon_date - date + 1,
                     astem = stems[(c_last_date.offset - 1) % 10],
                     abranch = branches[(c_last_date.offset - 1) % 12],
-                    amonth = month_name(c_last_date, lang, miscchar),
+                    amonth = layout.monnames[c_last_date.month,
+                        c_last_date.leap],
                     aleap = c_last_date.leap and miscchar[13] or '',
                     alength = miscchar[15 + int(
                         next_next_nmd - next_new_moon_date == 29)],
@@ -237,7 +453,8 @@ def print_month(year, month, days, lang='en', enc='ascii',
                     year = year,
                     stem = stems[(c_new_moon_date.offset - 1) % 10],
                     branch = branches[(c_new_moon_date.offset - 1) % 12],
-                    month = month_name(c_new_moon_date, lang, miscchar),
+                    month = layout.monnames[c_new_moon_date.month,
+                        c_new_moon_date.leap],
                     leap = c_new_moon_date.leap and miscchar[13] or '',
                     length = miscchar[15 + int(
                         next_new_moon_date - new_moon_date == 29)],
@@ -252,12 +469,12 @@ def print_month(year, month, days, lang='en', enc='ascii',
                 year = year,
                 stem = stems[(c_date.offset - 1) % 10],
                 branch = branches[(c_date.offset - 1) % 12],
-                month = month_name(c_date, lang, miscchar),
+                month = layout.monnames[c_date.month, c_date.leap],
                 leap = c_date.leap and miscchar[13] or '',
                 length = miscchar[15 + int(
                     new_moon_date - last_new_moon_date == 29)],
                 )
-    headlen = len(monthhead) + len(u''.join(filter(lambda c: ord(c) > 0xFF, monthhead)))
+    headlen = str_width(monthhead)
     def println(s):
         try:
             f.write(s.encode(enc))
@@ -265,8 +482,8 @@ def print_month(year, month, days, lang='en', enc='ascii',
         except:
             f.buffer.write(s.encode(enc))
             f.buffer.write(b'\n')
-    println(' ' * max(int((68 - headlen) / 2), 0) + monthhead)
-    println(''.join([dayowfmt % (daynames[i],) for i in range(7)]))
+    println(' ' * max(int((7 * width - 2 - headlen) / 2), 0) + monthhead)
+    println(layout.weekdays)
     dofw = pcc.day_of_week_from_fixed(date)
     if dofw > 4 and days == 31 or dofw > 5 and days == 30:
         weeks = 6
@@ -278,9 +495,13 @@ def print_month(year, month, days, lang='en', enc='ascii',
     show = ext.get('show')
     if show:
         stem, branch = pcc.chinese_day_name(date)
-        stem -= 1
-        branch -= 1
+        # index of the (stem, branch) pair in the sexagenary cycle
+        sexa = (6 * (stem - 1) - 5 * (branch - 1)) % 60
         anniv = ext.get('anniv')
+        # fitted anniversary labels, kept as long as the registry is
+        if not ext.get('anniv_cells') or ext['anniv_cells'][0] is not anniv:
+            ext['anniv_cells'] = (anniv, {})
+        anniv_cells = ext['anniv_cells'][1]
     for w in range(weeks):
         ar = []
         br = []
@@ -288,33 +509,19 @@ def print_month(year, month, days, lang='en', enc='ascii',
             if dcnt > days:
                 break
             if w == 0 and i < dofw:
-                ar.append('          ')
-                br.append('          ')
+                ar.append(layout.blank)
+                br.append(layout.blank)
                 continue
-            ar.append('%2d' % (dcnt,))
+            ar.append(layout.dates[dcnt])
             if not sameday and (date != minor_solterm_date
                     and date != major_solterm_date
                     and date != new_moon_date):
-                ar.append(' %s   ' % (day_name(ldcnt, lang, miscchar)))
+                ar.append(layout.days[ldcnt])
             elif sameday or (date != minor_solterm_date
                     and date != major_solterm_date
                     and date == new_moon_date):
-                s = month_name(c_new_moon_date, lang, miscchar)
                 cmonth = c_new_moon_date.month
-                if type(s) == int:
-                    ar.append(' [%2d]Y%s ' % (s,
-                        c_new_moon_date.leap and miscchar[13] or ' '))
-                else:
-                    assert s
-                    if c_new_moon_date.leap:
-                        s = miscchar[13] + s
-                    s += miscchar[14]
-                    if len(s) == 2:
-                        ar.append(' %s   ' % (s,))
-                    elif len(s) == 3:
-                        ar.append(' %s ' % (s,))
-                    else:
-                        ar.append(s)
+                ar.append(layout.months[cmonth, c_new_moon_date.leap])
                 if sameday:
                     sameday = False
                 elif next_new_moon_date <= last_date:
@@ -334,9 +541,9 @@ def print_month(year, month, days, lang='en', enc='ascii',
                 n = (month - 1) * 2
                 if date == major_solterm_date:
                     n += 1
-                ar.append(' %s   ' % (solterms[n],))
+                ar.append(layout.solterms[n])
             if show:
-                s = stems[stem] + branches[branch]
+                s = layout.sexagenary[sexa]
                 cr = get_anniv_on(anniv, year, month, dcnt, cmonth, ldcnt)
                 if cr:
                     if cr[0]:
@@ -357,7 +564,8 @@ def print_month(year, month, days, lang='en', enc='ascii',
                             'ID': cr[1][0][int(lang != 'en')], 'mul': ''}
                     else:
                         cr[1] = ''
-                    s = _anniv_fmt % (''.join(cr),)
+                    s = anniv_cell(anniv_cells, _anniv_fmt % (''.join(cr),),
+                            width)
                 elif month == 6: # check RuMei
                     if not ext.__contains__('RuMei') or ext['RuMei'][0] != year:
                         t, b = pcc.chinese_day_name(minor_solterm_date)
@@ -372,7 +580,7 @@ def print_month(year, month, days, lang='en', enc='ascii',
                             else:
                                 ext['RuMei'] = (year, minor_solterm_date +19-t)
                     if date == ext['RuMei'][1]:
-                        s = _miscterm_fmt % (miscterm[0],)
+                        s = layout.miscterms[0]
                     if not ext.__contains__('XZ') or ext['XZ'][0] != year:
                         t, b = pcc.chinese_day_name(major_solterm_date)
                         ext['XZ'] = (year, major_solterm_date, t, b)
@@ -390,8 +598,8 @@ def print_month(year, month, days, lang='en', enc='ascii',
                             else:
                                 ext['ChuMei'] = (year, minor_solterm_date +19-t)
                     if not ext.__contains__('XZ') or ext['XZ'][0] != year:
-                        d = pcc.fixed_from_moment(
-                                pcc.major_solar_term_on_or_after(date - 30))
+                        # XiaZhi, whichever day of July or August this is
+                        d = major_solterm_of(year, 6, ext.get('events'))
                         t, b = pcc.chinese_day_name(d)
                         ext['XZ'] = (year, d, t, b)
                     if not ext.__contains__('ChuFu') or ext['ChuFu'][0] != year:
@@ -401,15 +609,14 @@ def print_month(year, month, days, lang='en', enc='ascii',
                         else:
                             ext['ChuFu'] = (year, d + 37 - t, d + 47 - t)
                     if date == ext['ChuMei'][1]:
-                        s = _miscterm_fmt % (miscterm[1],)
+                        s = layout.miscterms[1]
                     elif date == ext['ChuFu'][1]:
-                        s = _miscterm_fmt % (miscterm[2],)
+                        s = layout.miscterms[2]
                     elif date == ext['ChuFu'][2]:
-                        s = _miscterm_fmt % (miscterm[3],)
+                        s = layout.miscterms[3]
                 elif month == 8: # check ZhongFu, MoFu
                     if not ext.__contains__('XZ') or ext['XZ'][0] != year:
-                        d = pcc.fixed_from_moment(
-                                pcc.major_solar_term_on_or_after(date - 61))
+                        d = major_solterm_of(year, 6, ext.get('events'))
                         t, b = pcc.chinese_day_name(d)
                         ext['XZ'] = (year, d, t, b)
                     if not ext.__contains__('ChuFu') or ext['ChuFu'][0] != year:
@@ -425,9 +632,9 @@ def print_month(year, month, days, lang='en', enc='ascii',
                         else:
                             ext['MoFu'] = (year, minor_solterm_date + 17 - t)
                     if date == ext['ChuFu'][2]:
-                        s = _miscterm_fmt % (miscterm[3],)
+                        s = layout.miscterms[3]
                     elif date == ext['MoFu'][1]:
-                        s = _miscterm_fmt % (miscterm[4],)
+                        s = layout.miscterms[4]
                 elif month == 12 or month < 4: # check *Jiu
                     if not ext.__contains__('DZ') or ext['DZ'][0] != year - int(
                             month != 12):
@@ -435,42 +642,17 @@ def print_month(year, month, days, lang='en', enc='ascii',
                             d = major_solterm_date
                             ext['DZ'] = (year, d)
                         else:
-                            d = pcc.fixed_from_moment(
-                                    pcc.major_solar_term_on_or_after(
-                                        pcc.fixed_from_gregorian(
-                                            (year - 1, 12, 1))))
+                            d = major_solterm_of(year - 1, 12,
+                                    ext.get('events'))
                             ext['DZ'] = (year - 1, d)
                         ext['Jiu'] = set([d + 9 * i for i in range(9)])
                     if date in ext['Jiu']:
                         d = date - ext['DZ'][1]
-                        s = _miscterm_fmt % (miscterm[5 + d / 9],)
-                x = len(u''.join(filter(lambda c: ord(c) > 0xFF, s)))
-                if len(s) + x <= 10:
-                    s = s.center(10 - x)
-                else:
-                    x = 8 - int(ord(s[-1]) > 0xFF)
-                    cr = []
-                    for j in range(len(s) - 1):
-                        x -= 1 + int(ord(s[j]) > 0xFF)
-                        if x > 0:
-                            cr.append(s[j])
-                        elif x == 0:
-                            break
-                        else:
-                            cr.append('.')
-                            break
-                    cr.append('..')
-                    cr.append(s[-1])
-                    s = ''.join(cr)
-                    x = len(u''.join(filter(lambda c: ord(c) > 0xFF, s)))
-                    assert len(s) + x == 10
+                        s = layout.miscterms[5 + d // 9]
                 br.append(s)
-                stem += 1
-                if stem == 10:
-                    stem = 0
-                branch += 1
-                if branch == 12:
-                    branch = 0
+                sexa += 1
+                if sexa == 60:
+                    sexa = 0
             date += 1
             dcnt += 1
             ldcnt += 1
@@ -583,7 +765,7 @@ if __name__ == '__main__':
     year, month = dt.date.today().timetuple()[:2]
     single = True
     try:
-        opt, args = getopt.getopt(sys.argv[1:], 'gusla:d:c')
+        opt, args = getopt.getopt(sys.argv[1:], 'gusla:d:cw:')
         opt = dict(opt)
         assert sum(map(int, map(opt.__contains__, ('-l', '-a', '-d')))) <= 1
         if opt.__contains__('-l') or opt.__contains__('-d'):
@@ -622,8 +804,8 @@ if __name__ == '__main__':
             raise
     except:
         traceback.print_exc()
-        print('Usage: %s [-g] [-u] [-s|-l|-a|-d] [-c] [[<month>] <year>].' % (
-                name,))
+        print('Usage: %s [-g] [-u] [-s|-l|-a|-d] [-c] [-w <columns>] '
+                '[[<month>] <year>].' % (name,))
         print('\t-g:\tGenerates simplified Chinese output.')
         print('\t-u:\tUses UTF-8 rather than GB for Chinese output.')
         print('\t-s:\tShow lines for daily sexagesimal names and misc terms.')
@@ -632,6 +814,7 @@ if __name__ == '__main__':
                 'ChuMei on 1st Wei day after XS (default)')
         print('\t\t BenCaoGangMu rules: RuMei on 1st Ren day after MZ, '
                 'ChuMei on 1st Ren day after XS')
+        print('\t-w:\tTerminal width in columns, at least 70 (default).')
         print('\t-l:\tList of registered anniversaries of birth / death.')
         print('\t-a:\tAdd anniversary. Syntax: -a <ID_en> <ID_cn> <type> '
                 '<calendar> <Gregorian_day> <month> <year>')
@@ -646,6 +829,12 @@ if __name__ == '__main__':
     if not 1645 <= year <= 7000:
         print('%s: Invalid year value: year 1645-7000.' % (name,))
         sys.exit(1)
+    try:
+        width = int(opt.get('-w', 70)) // 7
+        assert width >= 10
+    except:
+        print('%s: Invalid width value: at least 70 columns.' % (name,))
+        sys.exit(1)
     if pcc.is_gregorian_leap_year(year):
         _daysinmonth[1] = 29
     if opt.__contains__('-g'):
@@ -675,8 +864,10 @@ if __name__ == '__main__':
     elif opt.__contains__('-s'):
         ext['anniv'] = parse_anniv(get_db())
     if single:
-        print_month(year, month, _daysinmonth[month - 1], lang, enc, ext=ext)
+        print_month(year, month, _daysinmonth[month - 1], lang, enc, ext=ext,
+                width=width)
     else:
         lcd = None
         for i in range(12):
-            lcd = print_month(year, i + 1, _daysinmonth[i], lang, enc, lcd, ext)
+            lcd = print_month(year, i + 1, _daysinmonth[i], lang, enc, lcd,
+                    ext, width=width)
@@ -1,8 +1,49 @@
 #!/usr/bin/env python
+import io
+import os
+import sys
+import tempfile
+import subprocess
 import pyccal
 
 assert __name__ == '__main__'
 
+if pyccal.shared_memory:
+    events = pyccal.publish_events(2020, 2020)
+    name = events.handle.name
+    # a worker exiting must not take the table down with it
+    for i in range(2):
+        subprocess.check_call([sys.executable, '-c',
+            'import pyccal; pyccal.close_events(pyccal.attach_events(%r))' % (
+                name,)])
+    pyccal.close_events(events, unlink=True)
+
+def print_years(years, lang, enc, ext):
+    f = io.TextIOWrapper(io.BytesIO(), enc)
+    ext = dict(ext)
+    lcd = None
+    for year in years:
+        daysinmonth = list(pyccal._daysinmonth)
+        daysinmonth[1] = 28 + int(pyccal.pcc.is_gregorian_leap_year(year))
+        for i in range(12):
+            lcd = pyccal.print_month(year, i + 1, daysinmonth[i], lang, enc,
+                    lcd, ext, f)
+    return f.buffer.getvalue()
+
+fname = os.path.join(tempfile.mkdtemp(), 'events.bin')
+for years in (range(1645, 1648), range(2017, 2022), range(2033, 2035),
+        range(2060, 2062), range(2230, 2234)):
+    pyccal.save_events(fname, years[0], years[-1])
+    events = pyccal.load_events(fname)
+    for lang, enc in (('en', 'ascii'), ('chs', 'utf-8')):
+        for show in (False, True):
+            assert print_years(years, lang, enc, dict(show=show)) == \
+                    print_years(years, lang, enc,
+                            dict(show=show, events=events)), (years, lang, show)
+    pyccal.close_events(events)
+os.remove(fname)
+os.rmdir(os.path.dirname(fname))
+
 lcd = None
 for year in range(1645, 7001):
     if pyccal.pcc.is_gregorian_leap_year(year):